@@ -0,0 +1,59 @@
+""" Pre-decodes every wav once into a packed memory-mapped corpus.
+
+Decoding wavs on every epoch dominates dataloader CPU time. Building the
+corpus a single time lets `KEMDBase.get_wav` take a zero-copy slice of a
+flat `np.memmap` in O(1), with the OS page cache keeping hot data resident
+after the first epoch. Pass the resulting directory as `wav_mmap_dir` when
+instantiating the dataset.
+
+Layout of `out_dir`:
+    wavs.bin        all waveforms concatenated, int16 PCM
+    offsets.npy     int64 sample offsets of shape (N + 1,)
+    segment_ids.npy segment ids in corpus order
+"""
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from erc.utils import get_logger
+
+
+logger = get_logger(name=__name__)
+
+
+def build_wav_mmap(
+    dataset_name: str = "kemdy20",
+    out_dir: str | Path = "wavs_mmap",
+):
+    """ Decodes the full (fold -1) corpus in df order and writes it to
+    `out_dir`, along with the segment ids so fold-split dataset instances
+    can map their rows back onto corpus positions. """
+    # Imported here to dodge a circular import at package init
+    from erc.datasets import KEMDy19Dataset, KEMDy20Dataset
+
+    ds = {
+        "kemdy19": KEMDy19Dataset,
+        "kemdy20": KEMDy20Dataset,
+    }[dataset_name](tokenizer_name=None, max_length_wav=None, validation_fold=-1)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = list(ds.df["_wav_path"])
+    logger.info("Pre-decoding %s wavs into %s", len(paths), out_dir)
+
+    # Stored as int16: the source is 16-bit PCM, so this is bit-exact and
+    # halves the bytes moved through disk and page cache
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    with open(out_dir / "wavs.bin", "wb") as f:
+        for i, path in enumerate(paths):
+            arr = sf.read(str(path), dtype="int16", always_2d=False)[0]
+            f.write(arr.tobytes())
+            offsets[i + 1] = offsets[i] + len(arr)
+    np.save(out_dir / "offsets.npy", offsets)
+    np.save(out_dir / "segment_ids.npy", ds.df["segment_id"].to_numpy(object))
+    logger.info("Done. Pass wav_mmap_dir=%s to the dataset", out_dir)
+
+
+if __name__ == "__main__":
+    build_wav_mmap()
@@ -1,6 +1,8 @@
 from collections import OrderedDict
 from enum import Enum
 
+import numpy as np
+
 
 class Task(Enum):
     CLS = "classification"
@@ -100,4 +102,14 @@ emotion_va_20_dict = {
     '4_centroid': (3.838546, 3.6015217),
     '5_centroid': (2.5082645, 2.918182),
     '6_centroid': (2.2032788, 3.2934425)
-}
\ No newline at end of file
+}
+
+# Same centroid tables as (7, 2) float32 arrays, indexed by emotion index.
+# Consumers should prefer these over the string-keyed dicts above:
+# `arr[i]` skips the f'{i}_centroid' formatting and dict hash per lookup.
+emotion_va_19_20_arr = np.asarray(
+    [emotion_va_19_20_dict[f"{i}_centroid"] for i in range(7)], dtype=np.float32)
+emotion_va_19_arr = np.asarray(
+    [emotion_va_19_dict[f"{i}_centroid"] for i in range(7)], dtype=np.float32)
+emotion_va_20_arr = np.asarray(
+    [emotion_va_20_dict[f"{i}_centroid"] for i in range(7)], dtype=np.float32)
\ No newline at end of file
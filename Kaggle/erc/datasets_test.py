@@ -0,0 +1,74 @@
+import numpy as np
+import torch
+from transformers import Wav2Vec2FeatureExtractor
+
+from erc.datasets import HF_KEMD
+
+SAMPLING_RATE = 16_000
+
+
+def _make_collator(do_normalize: bool = True) -> HF_KEMD:
+    """ HF_KEMD without its heavy __init__ (dataset generation / disk IO):
+    `collate_fn` only touches `sampling_rate` and `wav_processor`. """
+    ds = HF_KEMD.__new__(HF_KEMD)
+    ds.sampling_rate = SAMPLING_RATE
+    ds.wav_processor = Wav2Vec2FeatureExtractor(sampling_rate=SAMPLING_RATE,
+                                                do_normalize=do_normalize)
+    return ds
+
+
+def _make_batch(lengths: list, seed: int = 42) -> list:
+    rng = np.random.default_rng(seed)
+    return [{
+        "wav": torch.from_numpy(rng.standard_normal(n).astype(np.float32)),
+        "wav_len": n,
+        "valence": 3.0 + i,
+        "arousal": 2.0 + i,
+    } for i, n in enumerate(lengths)]
+
+
+def test_collate_pads_to_whole_seconds():
+    lengths = [12_345, 31_999, 20_000]
+    out = _make_collator().collate_fn(_make_batch(lengths))
+    # Longest utterance (31,999 samples) rounds up to 2 full seconds
+    assert out["wav"].shape == (3, 2 * SAMPLING_RATE),\
+        f"Batch should pad to whole seconds. Given: {out['wav'].shape}"
+    assert out["wav_mask"].shape == out["wav"].shape
+
+
+def test_collate_rebuilds_wav_mask_from_lengths():
+    lengths = [SAMPLING_RATE, 2 * SAMPLING_RATE, 12_000]
+    out = _make_collator().collate_fn(_make_batch(lengths))
+    for row, n in zip(out["wav_mask"], lengths):
+        assert int(row.sum()) == n
+        assert bool(row[:n].all()) and not bool(row[n:].any()),\
+            "Mask should be a contiguous run of ones followed by zeros"
+
+
+def test_collate_prestacks_va():
+    batch = _make_batch([8_000, 9_000])
+    expected = torch.tensor([[s["valence"], s["arousal"]] for s in batch])
+    out = _make_collator().collate_fn([dict(s) for s in batch])
+    assert out["va"].shape == (2, 2)
+    torch.testing.assert_close(out["va"], expected)
+
+
+def test_collate_matches_wav_processor():
+    """ The batched masked zero-mean / unit-variance pass must stay
+    numerically equivalent to Wav2Vec2FeatureExtractor's per-sample
+    normalization it replaced. """
+    lengths = [12_345, 31_999, 20_000]
+    batch = _make_batch(lengths)
+    wavs = [s["wav"].numpy() for s in batch]
+    ds = _make_collator(do_normalize=True)
+    out = ds.collate_fn([dict(s) for s in batch])
+    expected = ds.wav_processor(wavs,
+                                sampling_rate=SAMPLING_RATE,
+                                padding="max_length",
+                                max_length=out["wav"].shape[1],
+                                return_attention_mask=True,
+                                return_tensors="np")
+    torch.testing.assert_close(out["wav"],
+                               torch.from_numpy(expected["input_values"]).float(),
+                               atol=1e-4, rtol=1e-4)
+    assert (out["wav_mask"].numpy() == expected["attention_mask"]).all()
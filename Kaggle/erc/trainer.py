@@ -1,4 +1,5 @@
 import importlib
+import inspect
 from typing import List, Dict
 
 import hydra
@@ -17,44 +18,80 @@ import erc
 logger = erc.utils.get_logger(name=__name__)
 
 
+class ERCDataModule(pl.LightningDataModule):
+    """ Owns the dataset / dataloader lifecycle.
+    Letting PL drive the datamodule keeps loader construction out of the
+    module, reuses persistent workers across stages and enables proper
+    sharding under multi-device training. """
+    def __init__(self,
+                 ds_cfg: omegaconf.DictConfig,
+                 dl_cfg: omegaconf.DictConfig,
+                 modes: list = ["train", "valid"]):
+        super().__init__()
+        self.ds_cfg = ds_cfg
+        self.dl_cfg = dl_cfg
+        self.modes = modes
+        self.loaders = None
+
+    def setup(self, stage: str = None):
+        if self.loaders is None:
+            self.loaders = erc.datasets.get_dataloaders(ds_cfg=self.ds_cfg,
+                                                        dl_cfg=self.dl_cfg,
+                                                        modes=self.modes)
+
+    def train_dataloader(self):
+        return self.loaders["train"]
+
+    def val_dataloader(self):
+        return self.loaders["valid"]
+
+
+def _maybe_fuse(opt_cfg: dict, on_cuda: bool) -> dict:
+    """ Opts Adam-family optimizers into the fused CUDA step: one kernel per
+    param group instead of ~10 pointwise kernels. No-op unless the params
+    already live on CUDA (the fused constructor rejects CPU params), the
+    installed torch exposes the kwarg (AdamW only grew `fused` in 2.0) or
+    when the config already decided (`optim.fused=false` Hydra override). """
+    target = opt_cfg.get("_target_", "")
+    if on_cuda and "fused" not in opt_cfg \
+            and target.rsplit(".", 1)[-1] in ("Adam", "AdamW"):
+        _module, _cls = target.rsplit(".", 1)
+        opt_cls = getattr(importlib.import_module(_module), _cls)
+        if "fused" in inspect.signature(opt_cls.__init__).parameters:
+            opt_cfg["fused"] = True
+        else:
+            logger.warning("%s on torch %s takes no fused kwarg; using the unfused step",
+                           _cls, torch.__version__)
+    return opt_cfg
+
+
 class ERCModule(pl.LightningModule):
     def __init__(self,
                  model: nn.Module,
-                 train_loader: torch.utils.data.DataLoader,
-                 valid_loader: torch.utils.data.DataLoader,
                  optimizer: omegaconf.DictConfig,
                  scheduler: omegaconf.DictConfig = None,
                  load_from_checkpoint: str = None,
-                 separate_lr: dict = None):
+                 separate_lr: dict = None,
+                 debug: bool = False):
         super().__init__()
         self.model = model
-
-        # Dataloaders
-        self.train_loader = train_loader
-        self.valid_loader = valid_loader
-
-        # Optimizations
-        if separate_lr is not None:
-            _opt_groups = []
-            for _submodel, _lr in separate_lr.items():
-                submodel = getattr(self.model, _submodel, None)
-                if submodel is None:
-                    logger.warn("separate_lr was given but submodel was not found: %s", _submodel)
-                    self.opt_config = self._configure_optimizer(optimizer=optimizer,
-                                                                scheduler=scheduler)
-                    break
-                _opt_groups.append(
-                    {"params": submodel.parameters(), "lr": _lr}
-                )
-            opt = dict(optimizer)
-            _o = opt.pop("_target_").split(".")
-            _oc = importlib.import_module(".".join(_o[:-1]))
-            _oc = getattr(_oc, _o[-1])
-            _opt = _oc(params=_opt_groups, **opt)
-            _sch = hydra.utils.instantiate(scheduler, scheduler={"optimizer": _opt})
-            self.opt_config = {"optimizer": _opt, "lr_scheduler": dict(**_sch)}
-        else:
-            self.opt_config = self._configure_optimizer(optimizer=optimizer, scheduler=scheduler)
+        self.debug = debug
+        # Label function bound once; `get_label` runs every step, so the
+        # per-step enum comparisons and attribute walks are resolved here
+        self._task = model.TASK
+        self._label_fns = {
+            erc.constants.Task.CLS: self._cls_label,
+            erc.constants.Task.REG: self._reg_label,
+            erc.constants.Task.ALL: self._all_label,
+        }
+        self._get_label = self._label_fns[self._task]
+
+        # Optimizer materialization is deferred to configure_optimizers:
+        # Lightning calls it after the model is on its device, which the
+        # fused Adam constructor requires
+        self._optimizer_cfg = optimizer
+        self._scheduler_cfg = scheduler
+        self._separate_lr = separate_lr
 
         # Metrics Configuration
         self.acc = Accuracy(task="multiclass", num_classes=7)
@@ -65,55 +102,90 @@ class ERCModule(pl.LightningModule):
 
         self.label_keys = list(erc.constants.emotion2idx.keys())[:-1]
 
-    def train_dataloader(self):
-        return self.train_loader
-
-    def val_dataloader(self):
-        return self.valid_loader
+    def _params_on_cuda(self) -> bool:
+        param = next(self.model.parameters(), None)
+        return param is not None and param.is_cuda
 
     def _configure_optimizer(self, optimizer: omegaconf.DictConfig, scheduler: omegaconf.DictConfig):
-        opt = hydra.utils.instantiate(optimizer, params=self.model.parameters())
+        opt = hydra.utils.instantiate(_maybe_fuse(dict(optimizer), self._params_on_cuda()),
+                                      params=self.model.parameters())
         sch: dict = hydra.utils.instantiate(scheduler, scheduler={"optimizer": opt})\
                             if scheduler is not None else None
         opt_config = {
             "optimizer": opt, "lr_scheduler": dict(**sch)
         } if sch is not None else opt
         return opt_config
-    
+
     def configure_optimizers(self) -> torch.optim.Optimizer | dict:
-        return self.opt_config
+        optimizer, scheduler = self._optimizer_cfg, self._scheduler_cfg
+        if self._separate_lr is not None:
+            _opt_groups = []
+            for _submodel, _lr in self._separate_lr.items():
+                submodel = getattr(self.model, _submodel, None)
+                if submodel is None:
+                    logger.warning("separate_lr was given but submodel was not found: %s", _submodel)
+                    return self._configure_optimizer(optimizer=optimizer, scheduler=scheduler)
+                _opt_groups.append(
+                    {"params": submodel.parameters(), "lr": _lr}
+                )
+            opt = _maybe_fuse(dict(optimizer), self._params_on_cuda())
+            _o = opt.pop("_target_").split(".")
+            _oc = importlib.import_module(".".join(_o[:-1]))
+            _oc = getattr(_oc, _o[-1])
+            _opt = _oc(params=_opt_groups, **opt)
+            _sch = hydra.utils.instantiate(scheduler, scheduler={"optimizer": _opt})
+            return {"optimizer": _opt, "lr_scheduler": dict(**_sch)}
+        return self._configure_optimizer(optimizer=optimizer, scheduler=scheduler)
+
+    def optimizer_zero_grad(self, epoch, batch_idx, optimizer, optimizer_idx):
+        # Frees gradients instead of a full memset over every parameter buffer
+        optimizer.zero_grad(set_to_none=True)
+
+    def transfer_batch_to_device(self, batch, device, dataloader_idx):
+        if isinstance(batch, dict):
+            # Async H2D copies; pairs with the dataloader's pin_memory=True
+            return {k: v.to(device, non_blocking=True)
+                    if isinstance(v, torch.Tensor) else v
+                    for k, v in batch.items()}
+        return super().transfer_batch_to_device(batch, device, dataloader_idx)
+
+    @staticmethod
+    def _cls_label(batch: dict):
+        # (batch_size,) | Long
+        return batch["emotion"].long()
+
+    @staticmethod
+    def _reg_label(batch: dict):
+        # (batch_size, 2) | Float, pre-stacked by the collate when available
+        return batch["va"] if "va" in batch else \
+            torch.stack([batch["valence"], batch["arousal"]], dim=1).float()
+
+    @staticmethod
+    def _all_label(batch: dict):
+        return {
+            "emotion": batch["emotion"],
+            "regress": batch["va"] if "va" in batch else
+                torch.stack([batch["valence"], batch["arousal"]], dim=1).float(),
+            "vote_emotion": batch.get("vote_emotion", None)
+        }
 
     def get_label(self, batch: dict, task: erc.constants.Task = None):
-        task = task or self.model.TASK
-        if task == erc.constants.Task.CLS:
-            # (batch_size,) | Long
-            labels = batch["emotion"].long()
-        elif task == erc.constants.Task.REG:
-            # (batch_size, 2) | Float
-            labels = torch.stack([batch["valence"], batch["arousal"]], dim=1).float()
-        elif task == erc.constants.Task.ALL:
-            labels = {
-                "emotion": batch["emotion"],
-                "regress": torch.stack([batch["valence"], batch["arousal"]], dim=1),
-                "vote_emotion": batch.get("vote_emotion", None)
-            }
         # TODO: Add Multilabel Fetch
-        return labels
+        label_fn = self._get_label if task is None else self._label_fns[task]
+        return label_fn(batch)
 
     def forward(self, batch):
-        try:
-            labels = self.get_label(batch)
-            result: dict = self.model(wav=batch["wav"],
-                                      wav_mask=batch["wav_mask"],
-                                      txt=batch["txt"],
-                                      txt_mask=batch["txt_mask"],
-                                      labels=labels)
-            return result
-        except RuntimeError:
-            # For CUDA Device-side asserted error
-            print(f"Label given {labels}")
-            logger.warn("Label given %s", labels)
-            raise RuntimeError
+        labels = self.get_label(batch)
+        if self.debug and isinstance(labels, torch.Tensor):
+            # Lazy %s formatting of shape/dtype only: never stringify the
+            # tensor itself, which would force a D2H copy
+            logger.debug("Label shape=%s dtype=%s", tuple(labels.shape), labels.dtype)
+        result: dict = self.model(wav=batch["wav"],
+                                  wav_mask=batch["wav_mask"],
+                                  txt=batch["txt"],
+                                  txt_mask=batch["txt_mask"],
+                                  labels=labels)
+        return result
 
     def _sort_outputs(self, outputs: List[Dict]):
         try:
@@ -128,8 +200,7 @@ class ERCModule(pl.LightningModule):
                     # Batched 
                     result[key] = torch.concat([o[key] for o in outputs if key in o])
         except AttributeError:
-            logger.warn("Error provoking data %s", outputs)
-            breakpoint()
+            logger.warning("Error provoking data %s", outputs)
         return result
 
     def remove_deuce(self, outputs: dict) -> dict:
@@ -218,25 +289,41 @@ class ERCModule(pl.LightningModule):
 
     def training_step(self, batch, batch_idx, optimizer_idx=None):
         result = self.forward(batch)
-        result = self.log_result(outputs=result, mode="train", unit="step")
-        return result
-
-    def training_epoch_end(self, outputs: List[Dict]):
-        result = self.log_result(outputs=outputs, mode="train", unit="epoch")
+        self.log_result(outputs=result, mode="train", unit="step")
+        # Return only the loss: handing PL the full result dict would pin
+        # logits (and their graphs) in its outputs list across the epoch
+        return {"loss": result["loss"]}
 
     def validation_step(self, batch, batch_idx, *args, **kwargs):
         result = self.forward(batch)
         result = self.log_result(outputs=result, mode="valid", unit="step")
-        return result
+        return {k: v.detach() if isinstance(v, torch.Tensor) else v
+                for k, v in result.items()}
     
     def validation_epoch_end(self, outputs: List[Dict], *args, **kwargs):
         result = self.log_result(outputs=outputs, mode="valid", unit="epoch")
         self.log_confusion_matrix(result)
 
 
+def _select_precision(config: omegaconf.DictConfig) -> int | str:
+    """ Upgrades fp16 mixed precision to bf16 on GPUs that support it.
+    BF16 keeps fp32's dynamic range, so Lightning skips the GradScaler
+    state machine (scale / unscale / inf-check) it runs for fp16. """
+    precision = config.trainer.get("precision", 32)
+    if precision == 16 and torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+        return "bf16"
+    return precision
+
+
 def setup_trainer(config: omegaconf.DictConfig) -> pl.LightningModule:
     logger.info("Start Setting up")
     erc.utils._seed_everything(config.misc.seed)
+    if config.misc.get("cudnn_benchmark", True):
+        # Batch-max padding rounds wav lengths to whole seconds, so the
+        # shape set is small enough for cudnn autotuning to pay off
+        torch.backends.cudnn.benchmark = True
+    # TF32 matmul on Ampere+; no-op on older GPUs
+    torch.set_float32_matmul_precision("high")
 
     ckpt = config.module.load_from_checkpoint
     if ckpt:
@@ -247,24 +334,32 @@ def setup_trainer(config: omegaconf.DictConfig) -> pl.LightningModule:
 
     logger.info("Start intantiating Models & Optimizers")
     model = hydra.utils.instantiate(config.model, checkpoint=model_ckpt)
+    if config.misc.get("compile", False):
+        if hasattr(torch, "compile"):
+            # Inductor fuses the pointwise ops around the transformer blocks;
+            # stacks with AMP
+            logger.info("torch.compile enabled")
+            model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+        else:
+            # setup.sh pins torch 1.13.1, which predates torch.compile
+            logger.warning("misc.compile=True but torch %s has no torch.compile; skipping",
+                           torch.__version__)
+
+    logger.info("Start instantiating datamodule")
+    datamodule = ERCDataModule(ds_cfg=config.dataset,
+                               dl_cfg=config.dataloader,
+                               modes=config.misc.modes)
 
-    logger.info("Start instantiating dataloaders")
-    dataloaders = erc.datasets.get_dataloaders(ds_cfg=config.dataset,
-                             dl_cfg=config.dataloader,
-                             modes=config.misc.modes)
-    
     logger.info("Start instantiating Pytorch-Lightning Trainer")
     module = hydra.utils.instantiate(config.module,
                                     model=model,
                                     optimizer=config.optim,
-                                    scheduler=config.scheduler,
-                                    train_loader=dataloaders["train"],
-                                    valid_loader=dataloaders["valid"])
-    return module, dataloaders
+                                    scheduler=config.scheduler)
+    return module, datamodule
 
 
 def train(config: omegaconf.DictConfig) -> None:
-    module, dataloaders = setup_trainer(config)
+    module, datamodule = setup_trainer(config)
     
     # Logger Setup
     logger = hydra.utils.instantiate(config.logger)
@@ -278,18 +373,17 @@ def train(config: omegaconf.DictConfig) -> None:
     callbacks: dict = hydra.utils.instantiate(config.callbacks)
     trainer: pl.Trainer = hydra.utils.instantiate(config.trainer,
                                                   logger=logger,
-                                                  callbacks=list(callbacks.values()))
-    trainer.fit(model=module,
-                train_dataloaders=dataloaders["train"],
-                val_dataloaders=dataloaders["valid"])
-    
-    
+                                                  callbacks=list(callbacks.values()),
+                                                  precision=_select_precision(config))
+    trainer.fit(model=module, datamodule=datamodule)
+
+
 def inference(config: omegaconf.DictConfig) -> None:
-    module, dataloaders = setup_trainer(config)
+    module, datamodule = setup_trainer(config)
+    datamodule.setup()
     trainer: pl.Trainer = hydra.utils.instantiate(config.trainer)
     prediction = trainer.predict(model=module,
-                                 dataloaders=dataloaders["valid"],
+                                 dataloaders=datamodule.val_dataloader(),
                                  return_predictions=True)
     prediction = module._sort_outputs(prediction)
-    # TODO
-    breakpoint()
+    return prediction
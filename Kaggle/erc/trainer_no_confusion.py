@@ -19,8 +19,6 @@ logger = erc.utils.get_logger(name=__name__)
 class ERCModule(pl.LightningModule):
     def __init__(self,
                  model: nn.Module,
-                 train_loader: torch.utils.data.DataLoader,
-                 valid_loader: torch.utils.data.DataLoader,
                  optimizer: omegaconf.DictConfig,
                  scheduler: omegaconf.DictConfig = None,
                  load_from_checkpoint: str = None,
@@ -28,10 +26,6 @@ class ERCModule(pl.LightningModule):
         super().__init__()
         self.model = model
 
-        # Dataloaders
-        self.train_loader = train_loader
-        self.valid_loader = valid_loader
-
         # Optimizations
         if separate_lr is not None:
             _opt_groups = []
@@ -61,12 +55,6 @@ class ERCModule(pl.LightningModule):
         self.ccc_val = ConcordanceCorrCoef(num_outputs=1)
         self.ccc_aro = ConcordanceCorrCoef(num_outputs=1)
 
-    def train_dataloader(self):
-        return self.train_loader
-
-    def valid_dataloader(self):
-        return self.valid_loader
-
     def _configure_optimizer(self, optimizer: omegaconf.DictConfig, scheduler: omegaconf.DictConfig):
         opt = hydra.utils.instantiate(optimizer, params=self.model.parameters())
         sch: dict = hydra.utils.instantiate(scheduler, scheduler={"optimizer": opt})\
@@ -125,8 +113,7 @@ class ERCModule(pl.LightningModule):
                     # Batched 
                     result[key] = torch.concat([o[key] for o in outputs if key in o])
         except AttributeError:
-            logger.warn("Error provoking data %s", outputs)
-            breakpoint()
+            logger.warning("Error provoking data %s", outputs)
         return result
 
     def remove_deuce(self, outputs: dict) -> dict:
@@ -217,25 +204,21 @@ def setup_trainer(config: omegaconf.DictConfig) -> pl.LightningModule:
     logger.info("Start intantiating Models & Optimizers")
     model = hydra.utils.instantiate(config.model, checkpoint=model_ckpt)
 
-    logger.info("Start instantiating dataloaders")
-    dataloaders = erc.datasets.get_dataloaders(ds_cfg=config.dataset,
-                             dl_cfg=config.dataloader,
-                             modes=config.misc.modes)
-    
-    logger.info("Start instantiating Pytorch-Lightning Trainer")
+    logger.info("Start instantiating datamodule")
+    datamodule = erc.trainer.ERCDataModule(ds_cfg=config.dataset,
+                                           dl_cfg=config.dataloader,
+                                           modes=config.misc.modes)
 
+    logger.info("Start instantiating Pytorch-Lightning Trainer")
     module = hydra.utils.instantiate(config.module,
                                     model=model,
                                     optimizer=config.optim,
-                                    scheduler=config.scheduler,
-                                    train_loader=dataloaders["train"],
-                                    valid_loader=dataloaders["valid"])
-
-    return module, dataloaders
+                                    scheduler=config.scheduler)
+    return module, datamodule
 
 
 def train(config: omegaconf.DictConfig) -> None:
-    module, dataloaders = setup_trainer(config)
+    module, datamodule = setup_trainer(config)
     
     # Logger Setup
     logger = hydra.utils.instantiate(config.logger)
@@ -250,6 +233,4 @@ def train(config: omegaconf.DictConfig) -> None:
     trainer: pl.Trainer = hydra.utils.instantiate(config.trainer,
                                                   logger=logger,
                                                   callbacks=list(callbacks.values()))
-    trainer.fit(model=module,
-                train_dataloaders=dataloaders["train"],
-                val_dataloaders=dataloaders["valid"])
+    trainer.fit(model=module, datamodule=datamodule)
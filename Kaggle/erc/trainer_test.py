@@ -0,0 +1,47 @@
+import inspect
+
+import omegaconf
+import torch
+
+from erc.trainer import _maybe_fuse, _select_precision
+
+
+def _adamw_accepts_fused() -> bool:
+    return "fused" in inspect.signature(torch.optim.AdamW.__init__).parameters
+
+
+def test_maybe_fuse_noop_on_cpu():
+    cfg = _maybe_fuse({"_target_": "torch.optim.AdamW", "lr": 1e-5}, on_cuda=False)
+    assert "fused" not in cfg
+
+
+def test_maybe_fuse_respects_constructor_signature():
+    # torch 1.13 AdamW takes no fused kwarg (only Adam does; AdamW grew it
+    # in 2.0) — injecting it regardless raised TypeError at fit start
+    cfg = _maybe_fuse({"_target_": "torch.optim.AdamW", "lr": 1e-5}, on_cuda=True)
+    assert ("fused" in cfg) == _adamw_accepts_fused()
+    if "fused" in cfg:
+        assert cfg["fused"] is True
+
+
+def test_maybe_fuse_keeps_explicit_choice():
+    # An optim.fused=false Hydra override must survive untouched
+    cfg = _maybe_fuse({"_target_": "torch.optim.AdamW", "fused": False}, on_cuda=True)
+    assert cfg["fused"] is False
+
+
+def test_maybe_fuse_ignores_non_adam():
+    cfg = _maybe_fuse({"_target_": "torch.optim.SGD", "lr": 1e-2}, on_cuda=True)
+    assert "fused" not in cfg
+
+
+def test_select_precision():
+    cfg = omegaconf.OmegaConf.create({"trainer": {"precision": 32}})
+    assert _select_precision(cfg) == 32
+
+    cfg = omegaconf.OmegaConf.create({"trainer": {"precision": 16}})
+    precision = _select_precision(cfg)
+    if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+        assert precision == "bf16"
+    else:
+        assert precision == 16